@@ -10,35 +10,140 @@ Purpose:
 
 import os
 import time
+import json
 import logging
+import sqlite3
+import threading
 import requests
 import csv
-from datetime import datetime, timezone
-
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+from datetime import datetime, timezone, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# orjson decodes the ~KB-scale Steam payloads 2-3x faster than stdlib json;
+# fall back transparently when it isn't installed.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+import numpy as np
 import pandas as pd
+import matplotlib
+
+# Headless runs (cron/CI) render PNGs via Agg instead of blocking on a GUI;
+# must be selected before pyplot is imported.
+HEADLESS = bool(os.environ.get("PLAYSTATS_HEADLESS"))
+if HEADLESS:
+    matplotlib.use("Agg")
+
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter
-from collections import Counter
 import plotly.graph_objects as go
 
 # ---------- Configuration ----------
 TOP_N = 100
 CSV_FILE = "steam_data.csv"
 BACKUP_CSV_FILE = "steam_data_backup.csv"
+DB_FILE = "steam_data.db"  # primary store; CSV is kept as export/fallback
+LATEST_RANKS_FILE = "steam_data_latest.json"  # sidecar: app_id -> rank of last snapshot
+LATEST_SNAPSHOT_FILE = "steam_data_latest.csv"  # cache: full rows of last snapshot only
+META_CACHE_FILE = "steam_meta_cache.json"  # per-app store metadata + learned banned ids
+META_CACHE_TTL = 86400  # seconds before cached store metadata is re-fetched
 REQUEST_TIMEOUT = 10
-SLEEP_BETWEEN_CALLS = 0.05  # seconds
+MAX_WORKERS = 12  # concurrent appdetails fetches
+
+# Steam allows roughly 200 store requests per 5 minutes; stay just under.
+RATE_LIMIT_CALLS = 190
+RATE_LIMIT_PERIOD = 300.0  # seconds
 
-BANNED_TITLES = {
+CHARTS_URL = "https://api.steampowered.com/ISteamChartsService/GetMostPlayedGames/v1/"
+STORE_URL = "https://store.steampowered.com/api/appdetails"
+
+# appdetails accepts comma-joined appids when filters= restricts the payload;
+# batching 20 per call collapses a Top-100 run from 100 requests to 5.
+APPDETAILS_BATCH_SIZE = 20
+APPDETAILS_FILTERS = "basic,price_overview,genres,release_date"
+
+BANNED_TITLES = frozenset({
     "Wallpaper Engine", "Soundpad", "SteamVR",
     "Steamworks Common Redistributables", "VRChat SDK",
     "Tabletop Simulator (Editor)", "Source Filmmaker",
     "RPG Maker MZ", "RPG Maker MV", "RPG Maker XP", "RPG Maker 2003",
     "3DMark", "FaceRig", "VoiceMod", "Wallpaper Engine - Editor"
-}
+})
 
 PRICE_BINS = [-0.01, 0.01, 9.99, 19.99, 29.99, 39.99, 49.99, 59.99, 69.99, 79.99, 1000]
 PRICE_LABELS = ["Free", "<$10", "<$20", "<$30", "<$40", "<$50", "<$60", "<$70", "<$80", "80+"]
 
+# Columns the pipeline actually consumes, with parse-time dtypes so pandas
+# skips inference (nullable Int* so malformed/blank cells don't fail the read).
+NEEDED_COLS = {
+    "app_id", "name", "genre", "genre_norm", "price", "release_date", "rank_position",
+    "previous_rank", "peak_in_game", "snapshot_time", "rank_status", "delta_rank",
+}
+# Row layout produced by collect_game_data, in storage order.
+ROW_COLUMNS = [
+    "app_id", "name", "genre", "genre_norm", "price", "release_date",
+    "rank_position", "previous_rank", "peak_in_game", "snapshot_time",
+]
+CSV_DTYPES = {
+    "app_id": "Int32",
+    "price": "float32",
+    "peak_in_game": "Int32",
+    "rank_position": "Int16",
+    "previous_rank": "float32",
+    "name": "string",
+    "genre": "string",
+    "genre_norm": "string",
+    "snapshot_time": "string",
+}
+
+# ---------- HTTP session ----------
+# One keep-alive session shared by all Steam calls; retries with backoff
+# replace ad-hoc per-call error handling for transient 429/5xx responses.
+SESSION = requests.Session()
+SESSION.headers["User-Agent"] = "PlayStats/1.0 (+https://github.com/DJVelz/PlayStats)"
+SESSION.headers["Accept-Encoding"] = "gzip, deflate"
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+)
+SESSION.mount("https://api.steampowered.com", _adapter)
+SESSION.mount("https://store.steampowered.com", _adapter)
+
+# ---------- Rate limiting ----------
+class _RateLimiter:
+    """
+    Token-bucket limiter: allows at most `calls` requests per `period` seconds.
+    Sleeps only when the budget is exhausted, unlike a fixed per-call sleep.
+    Thread-safe so it can sit in front of concurrent fetches.
+    """
+    def __init__(self, calls=RATE_LIMIT_CALLS, period=RATE_LIMIT_PERIOD):
+        self.calls = calls
+        self.period = period
+        self._lock = threading.Lock()
+        self._timestamps = deque()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._timestamps and now - self._timestamps[0] >= self.period:
+                    self._timestamps.popleft()
+                if len(self._timestamps) < self.calls:
+                    self._timestamps.append(now)
+                    return
+                wait = self.period - (now - self._timestamps[0])
+            time.sleep(wait)
+
+RATE_LIMITER = _RateLimiter()
+
 # ---------- Logging ----------
 logging.basicConfig(
     level=logging.INFO,
@@ -46,7 +151,92 @@ logging.basicConfig(
     datefmt="%H:%M:%S",
 )
 
+# ---------- SQLite store ----------
+def _connect_db(db_file=DB_FILE):
+    """Open the snapshot store, creating schema and indexes on first use."""
+    conn = sqlite3.connect(db_file)
+    # write-friendly pragmas: WAL journaling + relaxed fsync are safe for a
+    # store that can always be rebuilt from the CSV export
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS snapshots (
+            app_id INTEGER,
+            name TEXT,
+            genre TEXT,
+            genre_norm TEXT,
+            price REAL,
+            release_date TEXT,
+            rank_position INTEGER,
+            previous_rank INTEGER,
+            peak_in_game INTEGER,
+            snapshot_time TEXT,
+            rank_status TEXT,
+            delta_rank REAL
+        )
+    """)
+    # stores created before the genre_norm column gain it in place
+    try:
+        conn.execute("ALTER TABLE snapshots ADD COLUMN genre_norm TEXT")
+    except sqlite3.OperationalError:
+        pass
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_snap_time ON snapshots(snapshot_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_snap_app_time ON snapshots(app_id, snapshot_time)")
+    _migrate_csv_history(conn)
+    return conn
+
+
+def _migrate_csv_history(conn):
+    """One-time backfill: import any existing CSV history into an empty store."""
+    try:
+        if conn.execute("SELECT EXISTS(SELECT 1 FROM snapshots)").fetchone()[0]:
+            return
+        df = load_merged_dataframe(CSV_FILE, BACKUP_CSV_FILE)
+        if df.empty or "snapshot_time" not in df.columns:
+            return
+        # snapshot_time is compared as TEXT in the store (MAX, >= cutoff), so
+        # drop unparseable rows and canonicalize to the same ISO form live
+        # snapshots write -- otherwise stray values sort above real timestamps
+        ts = pd.to_datetime(df["snapshot_time"], errors="coerce", utc=True, cache=True)
+        df = df.loc[ts.notna()].copy()
+        if df.empty:
+            return
+        df["snapshot_time"] = ts.dropna().dt.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+        df.to_sql("snapshots", conn, if_exists="append", index=False, method="multi", chunksize=500)
+        conn.commit()
+        logging.info("Migrated %d historical rows from CSV into %s.", len(df), DB_FILE)
+    except Exception:
+        logging.exception("CSV -> SQLite migration failed")
+
+
+def _query_db(sql, params=()):
+    """Run a read query against the snapshot store; empty DataFrame on any failure."""
+    if not os.path.exists(DB_FILE):
+        return pd.DataFrame()
+    try:
+        with closing(_connect_db()) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+    except Exception as e:
+        logging.warning("SQLite read failed (%s); falling back to CSV.", e)
+        return pd.DataFrame()
+
 # ---------- Helpers: CSV loading/merging ----------
+def _prune_and_downcast(df):
+    """Keep only NEEDED_COLS and apply compact dtypes, tolerating bad cells."""
+    df = df[[c for c in df.columns if c in NEEDED_COLS]]
+    for col, dtype in CSV_DTYPES.items():
+        if col not in df.columns:
+            continue
+        try:
+            df[col] = df[col].astype(dtype)
+        except (ValueError, TypeError):
+            # coerce the odd unconvertible cell instead of losing the file
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+    return df
+
+
 def load_merged_dataframe(main_path=CSV_FILE, backup_path=BACKUP_CSV_FILE):
     """
     Load main CSV and, if exists, append backup CSV.
@@ -56,14 +246,14 @@ def load_merged_dataframe(main_path=CSV_FILE, backup_path=BACKUP_CSV_FILE):
     dfs = []
     if os.path.exists(main_path):
         try:
-            df_main = pd.read_csv(main_path, on_bad_lines="skip")
+            df_main = _prune_and_downcast(pd.read_csv(main_path, on_bad_lines="skip"))
             dfs.append(df_main)
         except Exception as e:
             logging.warning("Error reading main CSV %s: %s", main_path, e)
 
     if os.path.exists(backup_path):
         try:
-            df_bak = pd.read_csv(backup_path, on_bad_lines="skip")
+            df_bak = _prune_and_downcast(pd.read_csv(backup_path, on_bad_lines="skip"))
             # Use only common columns to avoid schema mismatch
             if dfs:
                 common = dfs[0].columns.intersection(df_bak.columns)
@@ -85,15 +275,33 @@ def load_merged_dataframe(main_path=CSV_FILE, backup_path=BACKUP_CSV_FILE):
 # ---------- Load previous ranks ----------
 def load_latest_ranks(csv_file):
     """Return dict of app_id -> previous rank from last snapshot (safe to call if file missing)."""
-    if not os.path.exists(csv_file) and not os.path.exists(BACKUP_CSV_FILE):
-        return {}
+    # Fast path: save_snapshot maintains a tiny sidecar with just the last
+    # snapshot's ranks, so we avoid re-parsing the whole CSV history.
+    if os.path.exists(LATEST_RANKS_FILE):
+        try:
+            with open(LATEST_RANKS_FILE, encoding="utf-8") as f:
+                return {int(app_id): rank for app_id, rank in json.load(f).items()}
+        except Exception as e:
+            logging.warning("Error reading %s: %s; falling back to CSV scan.", LATEST_RANKS_FILE, e)
 
+    # Next tier: indexed point query against the SQLite store.
+    db_ranks = _query_db(
+        "SELECT app_id, rank_position FROM snapshots "
+        "WHERE snapshot_time = (SELECT MAX(snapshot_time) FROM snapshots)"
+    )
+    if not db_ranks.empty:
+        ranks = {int(a): int(r) for a, r in zip(db_ranks["app_id"], db_ranks["rank_position"]) if pd.notna(r)}
+        # warm the sidecar so the next run skips straight to the fast path
+        _write_ranks_sidecar(ranks)
+        return ranks
+
+    # no extra exists() probes here: load_merged_dataframe stats each file once
     df = load_merged_dataframe(csv_file, BACKUP_CSV_FILE)
     if df.empty or "snapshot_time" not in df.columns or "app_id" not in df.columns:
         return {}
 
     # parse snapshot_time safely
-    df["snapshot_time"] = pd.to_datetime(df["snapshot_time"], errors="coerce", utc=True)
+    df["snapshot_time"] = pd.to_datetime(df["snapshot_time"], errors="coerce", utc=True, cache=True)
     df = df.dropna(subset=["snapshot_time"])
     if df.empty:
         return {}
@@ -103,15 +311,42 @@ def load_latest_ranks(csv_file):
     # ensure rank_position exists
     if "rank_position" not in latest_df.columns:
         return {}
-    return dict(zip(latest_df["app_id"], latest_df["rank_position"]))
+    ranks = {int(a): int(r) for a, r in zip(latest_df["app_id"], latest_df["rank_position"]) if pd.notna(r)}
+    _write_ranks_sidecar(ranks)
+    return ranks
+
+# ---------- Store metadata cache ----------
+def _load_meta_cache():
+    """Load the per-app metadata cache, or a fresh empty one on any problem."""
+    if os.path.exists(META_CACHE_FILE):
+        try:
+            with open(META_CACHE_FILE, encoding="utf-8") as f:
+                cache = json.load(f)
+            if isinstance(cache, dict):
+                cache.setdefault("apps", {})
+                cache.setdefault("banned", [])
+                return cache
+        except Exception as e:
+            logging.warning("Error reading %s: %s; starting with empty cache.", META_CACHE_FILE, e)
+    return {"apps": {}, "banned": []}
+
+
+def _save_meta_cache(cache):
+    """Overwrite the metadata cache atomically (write tmp, then rename)."""
+    try:
+        tmp = META_CACHE_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp, META_CACHE_FILE)
+    except Exception:
+        logging.exception("Failed to update %s", META_CACHE_FILE)
 
 # ---------- Fetch Top Games ----------
 def fetch_top_games(top_n=TOP_N):
-    url = "https://api.steampowered.com/ISteamChartsService/GetMostPlayedGames/v1/"
     try:
-        resp = requests.get(url, timeout=REQUEST_TIMEOUT)
+        resp = SESSION.get(CHARTS_URL, timeout=REQUEST_TIMEOUT)
         resp.raise_for_status()
-        data = resp.json().get("response", {}).get("ranks", [])
+        data = _json_loads(resp.content).get("response", {}).get("ranks", [])
         logging.info("Fetched %d top games.", len(data))
         return data[:top_n]
     except Exception:
@@ -120,73 +355,221 @@ def fetch_top_games(top_n=TOP_N):
 
 # ---------- Collect Game Data ----------
 def collect_game_data(top_games, snapshot_time, prev_ranks):
-    rows = []
-    for idx, game in enumerate(top_games, start=1):
+    total = len(top_games)
+
+    # Store metadata (name/genres/price/release date) changes rarely: serve it
+    # from the on-disk cache while fresh, and remember banned/non-game ids so
+    # those apps never cost an HTTP round-trip again.
+    cache = _load_meta_cache()
+    apps_cache = cache["apps"]
+    banned_ids = set(cache["banned"])
+    cache_lock = threading.Lock()
+    now = time.time()
+
+    def build_row(idx, game, data):
+        """Assemble one snapshot row from charts rank info plus store data, or None."""
+        app_id = game.get("appid")
+        # skip obvious non-games and banned titles
+        if data.get("type") != "game" or data.get("name") in BANNED_TITLES:
+            logging.debug("Skipping non-game or banned title: %s (type=%s)", data.get("name"), data.get("type"))
+            with cache_lock:
+                banned_ids.add(app_id)
+            return None
+        genre_names = [g.get("description", "") for g in data.get("genres", []) or []]
+        row = {
+            "app_id": app_id,
+            "name": data.get("name", "Unknown"),
+            "genre": ", ".join(genre_names),
+            # normalized tokens, computed once at ingest so dashboard renders
+            # don't re-run the lowercase/split/strip chain on raw strings
+            "genre_norm": ";".join(n.strip().lower() for n in genre_names if n.strip()),
+            "price": data.get("price_overview", {}).get("final", 0) / 100 if data.get("price_overview") else 0.0,
+            "release_date": data.get("release_date", {}).get("date", "Unknown"),
+            "rank_position": game.get("rank"),
+            "previous_rank": prev_ranks.get(app_id),
+            "peak_in_game": game.get("peak_in_game"),
+            "snapshot_time": snapshot_time
+        }
+        with cache_lock:
+            apps_cache[str(app_id)] = {
+                "ts": now,
+                "name": row["name"],
+                "genre": row["genre"],
+                "genre_norm": row["genre_norm"],
+                "price": row["price"],
+                "release_date": row["release_date"],
+            }
+        logging.debug("[%d/%d] Collected: %s", idx, total, data.get("name", "Unknown"))
+        return row
+
+    def row_from_cache(idx, game, meta):
+        """Assemble a row from cached metadata plus this run's rank/peak figures."""
+        app_id = game.get("appid")
+        row = {
+            "app_id": app_id,
+            "name": meta.get("name", "Unknown"),
+            "genre": meta.get("genre", ""),
+            "genre_norm": meta.get("genre_norm", ""),
+            "price": meta.get("price", 0.0),
+            "release_date": meta.get("release_date", "Unknown"),
+            "rank_position": game.get("rank"),
+            "previous_rank": prev_ranks.get(app_id),
+            "peak_in_game": game.get("peak_in_game"),
+            "snapshot_time": snapshot_time
+        }
+        logging.debug("[%d/%d] Collected (cached): %s", idx, total, row["name"])
+        return row
+
+    def fetch_one(item):
+        """Fetch store details for one ranked game; returns a row dict or None."""
+        idx, game = item
         app_id = game.get("appid")
         if not app_id:
-            continue
+            return None
         try:
-            # request in English; optionally you could add cc=us for USD pricing: &cc=us
-            resp = requests.get(
-                f"https://store.steampowered.com/api/appdetails?appids={app_id}&l=english&cc=us",
+            # request in English; cc=us pins USD pricing
+            RATE_LIMITER.acquire()
+            resp = SESSION.get(
+                STORE_URL,
+                params={"appids": app_id, "filters": APPDETAILS_FILTERS, "l": "english", "cc": "us"},
                 timeout=REQUEST_TIMEOUT
             )
             resp.raise_for_status()
-            entry = resp.json().get(str(app_id))
+            entry = _json_loads(resp.content).get(str(app_id))
             if not entry or not entry.get("success"):
                 logging.debug("No store data for app_id=%s", app_id)
-                time.sleep(SLEEP_BETWEEN_CALLS)
-                continue
-
-            data = entry["data"]
-            # skip obvious non-games and banned titles
-            if data.get("type") != "game" or data.get("name") in BANNED_TITLES:
-                logging.debug("Skipping non-game or banned title: %s (type=%s)", data.get("name"), data.get("type"))
-                time.sleep(SLEEP_BETWEEN_CALLS)
-                continue
-
-            prev_rank = prev_ranks.get(app_id)
-            rows.append({
-                "app_id": app_id,
-                "name": data.get("name", "Unknown"),
-                "genre": ", ".join([g.get("description", "") for g in data.get("genres", [])]) if data.get("genres") else "",
-                "price": data.get("price_overview", {}).get("final", 0) / 100 if data.get("price_overview") else 0.0,
-                "release_date": data.get("release_date", {}).get("date", "Unknown"),
-                "rank_position": game.get("rank"),
-                "previous_rank": prev_rank,
-                "peak_in_game": game.get("peak_in_game"),
-                "snapshot_time": snapshot_time
-            })
-            logging.info("[%d/%d] Collected: %s", idx, len(top_games), data.get("name", "Unknown"))
-            time.sleep(SLEEP_BETWEEN_CALLS)
-
+                return None
+            return build_row(idx, game, entry["data"])
         except Exception:
             logging.exception("Error processing app_id=%s", app_id)
+            return None
+
+    def fetch_batch(items):
+        """Fetch appdetails for a chunk of ranked games in a single request."""
+        ids = ",".join(str(g.get("appid")) for _, g in items if g.get("appid"))
+        payload = {}
+        if ids:
+            try:
+                RATE_LIMITER.acquire()
+                resp = SESSION.get(
+                    STORE_URL,
+                    params={"appids": ids, "filters": APPDETAILS_FILTERS, "l": "english", "cc": "us"},
+                    timeout=REQUEST_TIMEOUT
+                )
+                resp.raise_for_status()
+                payload = _json_loads(resp.content) or {}
+            except Exception:
+                logging.exception("Error fetching appdetails batch (%s)", ids)
+
+        rows = []
+        for idx, game in items:
+            app_id = game.get("appid")
+            if not app_id:
+                continue
+            entry = payload.get(str(app_id))
+            if entry and entry.get("success"):
+                row = build_row(idx, game, entry["data"])
+            else:
+                # the batched endpoint occasionally omits entries; retry those individually
+                row = fetch_one((idx, game))
+            if row:
+                rows.append(row)
+        return rows
+
+    # partition: cached apps produce rows immediately, the rest go to Steam
+    t0 = time.perf_counter()
+    known_banned = len(banned_ids)
+    rows = []
+    to_fetch = []
+    skipped_banned = 0
+    for idx, game in enumerate(top_games, start=1):
+        app_id = game.get("appid")
+        if not app_id:
             continue
+        if app_id in banned_ids:
+            skipped_banned += 1
+            continue
+        meta = apps_cache.get(str(app_id))
+        if meta and now - meta.get("ts", 0) < META_CACHE_TTL:
+            rows.append(row_from_cache(idx, game, meta))
+        else:
+            to_fetch.append((idx, game))
+    n_cached = len(rows)
+
+    batches = [to_fetch[i:i + APPDETAILS_BATCH_SIZE] for i in range(0, len(to_fetch), APPDETAILS_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # as_completed lets finished batches land immediately instead of
+        # map()'s in-order delivery stalling behind one slow batch
+        futures = [executor.submit(fetch_batch, batch) for batch in batches]
+        for future in as_completed(futures):
+            rows.extend(future.result())
+    rows.sort(key=lambda r: r.get("rank_position") or 0)
+
+    cache["banned"] = sorted(banned_ids)
+    _save_meta_cache(cache)
+
+    # one summary line instead of ~100 per-app INFO records (those are DEBUG
+    # now); keeps the logging handler off the hot concurrent path
+    newly_flagged = len(banned_ids) - known_banned
+    failed = max(len(to_fetch) - (len(rows) - n_cached) - newly_flagged, 0)
+    logging.info(
+        "Collected %d/%d games in %.2fs (%d cached, %d known banned skipped, %d newly flagged, %d failed).",
+        len(rows), total, time.perf_counter() - t0, n_cached, skipped_banned, newly_flagged, failed,
+    )
 
-    df = pd.DataFrame(rows)
-    # compute rank status/delta
-    def compute_status(row):
-        prev, cur = row.get("previous_rank"), row.get("rank_position")
-        if pd.isna(prev) or prev is None:
-            return "new"
-        try:
-            # smaller numeric rank = better (1 is top)
-            if int(cur) < int(prev):
-                return "up"
-            if int(cur) > int(prev):
-                return "down"
-        except Exception:
-            pass
-        return "same"
-
+    # explicit columns + dtypes: skips schema inference, avoids object-dtype
+    # fallback on sparse columns, and roughly halves the frame in memory
+    df = pd.DataFrame.from_records(rows, columns=ROW_COLUMNS)
+    if not df.empty:
+        df = df.astype({
+            "app_id": "int32",
+            "price": "float32",
+            "rank_position": "int16",
+            "previous_rank": "float32",
+            "peak_in_game": "Int32",  # nullable: charts payloads may omit it
+        })
+    # compute rank status/delta (vectorized; smaller numeric rank = better, 1 is top)
     if not df.empty:
-        df["rank_status"] = df.apply(compute_status, axis=1)
-        # delta = previous_rank - current_rank (positive means climbs)
-        df["delta_rank"] = pd.to_numeric(df["previous_rank"], errors="coerce").fillna(df["rank_position"]) - pd.to_numeric(df["rank_position"], errors="coerce")
+        prev = df["previous_rank"]
+        cur = df["rank_position"]
+        df["rank_status"] = np.select(
+            [prev.isna(), cur < prev, cur > prev],
+            ["new", "up", "down"],
+            default="same",
+        )
+        df["rank_status"] = df["rank_status"].astype("category")
+        # delta = previous_rank - current_rank (positive means climbs);
+        # both columns are already numeric thanks to the astype above
+        df["delta_rank"] = prev.fillna(cur) - cur
     return df
 
 # ---------- Save Snapshot ----------
+def _write_ranks_sidecar(ranks):
+    """Atomically overwrite the latest-ranks sidecar with an app_id -> rank map."""
+    try:
+        tmp = LATEST_RANKS_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(ranks, f)
+        os.replace(tmp, LATEST_RANKS_FILE)
+    except Exception:
+        logging.exception("Failed to update %s", LATEST_RANKS_FILE)
+
+
+def _save_latest_ranks(df):
+    ranks = {int(a): int(r) for a, r in zip(df["app_id"], df["rank_position"]) if pd.notna(r)}
+    _write_ranks_sidecar(ranks)
+
+
+def _save_latest_snapshot(df):
+    """Overwrite the small latest-snapshot cache atomically (write tmp, then rename)."""
+    try:
+        tmp = LATEST_SNAPSHOT_FILE + ".tmp"
+        df.to_csv(tmp, index=False, quoting=csv.QUOTE_MINIMAL)
+        os.replace(tmp, LATEST_SNAPSHOT_FILE)
+    except Exception:
+        logging.exception("Failed to update %s", LATEST_SNAPSHOT_FILE)
+
+
 def save_snapshot(df):
     if df is None or df.empty:
         logging.warning("No data to save.")
@@ -194,41 +577,117 @@ def save_snapshot(df):
 
     # ensure safe CSV quoting to avoid future corruption
     df = df.drop_duplicates(subset=["app_id", "snapshot_time"])
+
+    # primary store: one transactional batch append into SQLite
     try:
+        with closing(_connect_db()) as conn:
+            df.to_sql("snapshots", conn, if_exists="append", index=False, method="multi", chunksize=500)
+            conn.commit()
+        logging.info("Saved snapshot to %s (%d entries).", DB_FILE, len(df))
+    except Exception:
+        logging.exception("Failed to write snapshot to %s", DB_FILE)
+
+    # CSV export doubles as the fallback store and stays human-greppable
+    try:
+        # stat the file once: avoids repeated syscalls and the race where it
+        # appears between the mode= and header= checks (headerless CSV)
+        exists = os.path.exists(CSV_FILE)
+        if exists:
+            with open(CSV_FILE, newline="") as f:
+                header = next(csv.reader(f), [])
+            if header and header != list(df.columns):
+                # schema drifted (e.g. genre_norm added): rewrite once under
+                # the new header -- the CSV twin of the ALTER TABLE above --
+                # so appended rows stay aligned with the file
+                old = pd.read_csv(CSV_FILE, on_bad_lines="skip")
+                old.reindex(columns=df.columns).to_csv(
+                    CSV_FILE + ".tmp", index=False, quoting=csv.QUOTE_MINIMAL
+                )
+                os.replace(CSV_FILE + ".tmp", CSV_FILE)
         df.to_csv(
             CSV_FILE,
-            mode="a" if os.path.exists(CSV_FILE) else "w",
-            header=not os.path.exists(CSV_FILE),
+            mode="a" if exists else "w",
+            header=not exists,
             index=False,
             quoting=csv.QUOTE_MINIMAL
         )
         logging.info("Saved snapshot to %s (%d entries).", CSV_FILE, len(df))
+        _save_latest_ranks(df)
+        _save_latest_snapshot(df)
         return True
     except Exception:
         logging.exception("Failed to save snapshot")
         return False
 
 # ---------- Visualization / Dashboard ----------
-def visualize_dashboard():
-    # Merge main + backup if available, skipping bad lines
-    df = load_merged_dataframe(CSV_FILE, BACKUP_CSV_FILE)
-    if df.empty:
-        logging.error("No data available to visualize.")
-        return
-
-    # Try to parse snapshot_time robustly (handle mixed formats)
-    df["snapshot_time"] = pd.to_datetime(df["snapshot_time"], errors="coerce", utc=True)
-    # Drop rows with no timestamp or no peak value
-    df = df.dropna(subset=["snapshot_time"])
-    if "peak_in_game" in df.columns:
-        df = df[pd.to_numeric(df["peak_in_game"], errors="coerce") > 0]
+def _explode_genres(snap):
+    """
+    Explode a snapshot into one row per (game, genre token), token in '_genre'.
+    Prefers the pre-normalized genre_norm column; falls back to normalizing
+    the raw genre strings for history rows that predate it.
+    """
+    if "genre_norm" in snap.columns and snap["genre_norm"].notna().any():
+        tokens = snap["genre_norm"].fillna("").str.split(";")
     else:
+        tokens = snap["genre"].fillna("").str.lower().str.split(",")
+    exploded = snap.assign(_genre=tokens).explode("_genre")
+    exploded["_genre"] = exploded["_genre"].str.strip()
+    return exploded[exploded["_genre"] != ""]
+
+
+def _prepare_history(df):
+    """Parse timestamps robustly and drop rows unusable for plotting."""
+    if df.empty:
+        return df
+    if "peak_in_game" not in df.columns:
         logging.error("No 'peak_in_game' column present in data.")
-        return
+        return pd.DataFrame()
+    df["snapshot_time"] = pd.to_datetime(df["snapshot_time"], errors="coerce", utc=True, cache=True)
+    df = df.dropna(subset=["snapshot_time"])
+    return df[pd.to_numeric(df["peak_in_game"], errors="coerce") > 0]
+
+
+def _load_latest_snapshot_cache():
+    """Return (snap, latest_time) from the latest-snapshot cache, or (None, None)."""
+    if not os.path.exists(LATEST_SNAPSHOT_FILE):
+        return None, None
+    try:
+        snap = pd.read_csv(
+            LATEST_SNAPSHOT_FILE, on_bad_lines="skip",
+            usecols=lambda c: c in NEEDED_COLS, dtype=CSV_DTYPES,
+        )
+        snap = _prepare_history(snap)
+        if snap.empty:
+            return None, None
+        return snap, snap["snapshot_time"].max()
+    except Exception as e:
+        logging.warning("Error reading %s: %s; falling back to full history.", LATEST_SNAPSHOT_FILE, e)
+        return None, None
 
-    # Identify latest snapshot and prepare snapshot 'snap'
-    latest_time = df["snapshot_time"].max()
-    snap = df[df["snapshot_time"] == latest_time].sort_values(by="peak_in_game", ascending=False)
+
+def visualize_dashboard():
+    # Latest snapshot drives everything except the trend chart; serve it from
+    # the ~TOP_N-row cache when present so the full history stays on disk.
+    df = None
+    snap, latest_time = _load_latest_snapshot_cache()
+    if snap is None:
+        # indexed point query against the SQLite store
+        db_snap = _prepare_history(_query_db(
+            "SELECT * FROM snapshots "
+            "WHERE snapshot_time = (SELECT MAX(snapshot_time) FROM snapshots)"
+        ))
+        if not db_snap.empty:
+            snap = db_snap
+            latest_time = snap["snapshot_time"].max()
+    if snap is None:
+        # last resort: merge main + backup CSVs and scan for the latest snapshot
+        df = _prepare_history(load_merged_dataframe(CSV_FILE, BACKUP_CSV_FILE))
+        if df.empty:
+            logging.error("No data available to visualize.")
+            return
+        latest_time = df["snapshot_time"].max()
+        snap = df[df["snapshot_time"] == latest_time]
+    snap = snap.sort_values(by="peak_in_game", ascending=False)
 
     if snap.empty:
         logging.error("Latest snapshot is empty.")
@@ -237,28 +696,24 @@ def visualize_dashboard():
     # Summary metrics
     most_played = snap.iloc[0]["name"]
     avg_price = snap.head(15)["price"].mean() if "price" in snap.columns else 0.0
-    common_genre_series = (
-        snap["genre"]
-        .dropna()
-        .str.lower()
-        .str.split(",")
-        .explode()
-        .str.strip()
-        .replace("", None)
-        .dropna()
-    )
-    common_genre = common_genre_series.mode().iloc[0].capitalize() if not common_genre_series.empty else "Unknown"
 
-    # Peak revenue estimate
-    snap["peak_revenue"] = snap["price"] * snap["peak_in_game"]
-    top_revenue = snap.sort_values("peak_revenue", ascending=False).head(5)[["name", "peak_revenue"]]
+    # Genre tokens, exploded once; every genre metric below reuses this frame.
+    exploded = _explode_genres(snap)
+
+    # One value_counts serves both the headline genre and the distribution plot
+    genre_counts = exploded["_genre"].value_counts() if not exploded.empty else pd.Series(dtype="int64")
+    common_genre = genre_counts.index[0].capitalize() if not genre_counts.empty else "Unknown"
+
+    # Peak revenue estimate: top-5 via argpartition on the raw arrays -- O(N)
+    # instead of a full sort, and no temporary column on the snapshot slice
+    revenue = snap["price"].fillna(0.0).to_numpy(dtype=np.float64) * snap["peak_in_game"].astype("float64").to_numpy()
+    k = min(5, len(revenue))
+    top5_idx = np.argpartition(-revenue, k - 1)[:k]
+    top5_idx = top5_idx[np.argsort(-revenue[top5_idx])]
+    top_revenue = snap.iloc[top5_idx][["name"]].assign(peak_revenue=revenue[top5_idx])
 
     # Top genres by avg players
-    genre_df = snap.assign(genre=snap["genre"].str.lower().str.split(","))
-    genre_df = genre_df.explode("genre")
-    genre_df["genre"] = genre_df["genre"].str.strip()
-    genre_df = genre_df.dropna(subset=["genre"])
-    top_genres = genre_df.groupby("genre")["peak_in_game"].mean().sort_values(ascending=False).head(5)
+    top_genres = exploded.groupby("_genre")["peak_in_game"].mean().nlargest(5)
 
     # Delta summary (new/climbs/falls)
     new_count = (snap["rank_status"] == "new").sum() if "rank_status" in snap.columns else 0
@@ -304,18 +759,20 @@ def visualize_dashboard():
     axes[0, 0].yaxis.set_major_formatter(FuncFormatter(lambda x, _: f"{int(x/1000)}k"))
 
     # 2) Genre Distribution
-    genres = snap["genre"].dropna().str.lower().str.split(",").explode().str.strip()
-    genre_counts = Counter(genres)
-    top_genre_items = genre_counts.most_common(10)
-    if top_genre_items:
-        axes[0, 1].bar(*zip(*top_genre_items), color="orange")
+    top_genre_counts = genre_counts.head(10)
+    if not top_genre_counts.empty:
+        axes[0, 1].bar(top_genre_counts.index, top_genre_counts.values, color="orange")
     axes[0, 1].set_title("Top 10 Genres")
     axes[0, 1].tick_params(axis="x", rotation=45)
 
     # 3) Price Distribution
-    price_cats = pd.cut(snap["price"], bins=PRICE_BINS, labels=PRICE_LABELS)
-    price_counts = price_cats.value_counts().sort_index()
-    axes[1, 0].bar(price_counts.index, price_counts.values, color="limegreen")
+    # monotonic bin lookup in one pass: searchsorted with side="left" matches
+    # pd.cut's right-closed intervals, bincount tallies without a Categorical
+    prices = snap["price"].fillna(0.0).to_numpy(dtype=np.float64)
+    codes = np.searchsorted(np.asarray(PRICE_BINS, dtype=np.float64), prices, side="left") - 1
+    codes = np.clip(codes, 0, len(PRICE_LABELS) - 1)
+    price_counts = np.bincount(codes, minlength=len(PRICE_LABELS))
+    axes[1, 0].bar(PRICE_LABELS, price_counts, color="limegreen")
     axes[1, 0].set_title("Price Range Distribution")
     axes[1, 0].tick_params(axis="x", rotation=0)
 
@@ -326,15 +783,34 @@ def visualize_dashboard():
     axes[1, 1].text(0.05, 0.6, summary, fontsize=12)
 
     plt.tight_layout(rect=[0, 0, 1, 0.96])
-    plt.show()
+    # always persist the PNG so scheduled runs leave an artifact; the
+    # blocking GUI window only opens for interactive use
+    out_file = f"dashboard_{latest_time.strftime('%Y%m%d_%H%M%S')}.png"
+    fig.savefig(out_file, dpi=100)
+    logging.info("Saved dashboard to %s", out_file)
+    if HEADLESS:
+        plt.close(fig)
+    else:
+        plt.show()
 
     # ---------- Plotly Interactive Line Chart (Top 10 over 90 days) ----------
+    # The trend chart is the only consumer of history; pull the 90-day window
+    # through the snapshot_time index, falling back to the CSV merge.
+    if df is None:
+        cutoff_iso = (datetime.now(timezone.utc) - timedelta(days=90)).isoformat(timespec="seconds")
+        df = _prepare_history(_query_db(
+            "SELECT app_id, name, peak_in_game, snapshot_time FROM snapshots "
+            "WHERE snapshot_time >= ?", (cutoff_iso,)
+        ))
+        if df.empty:
+            df = _prepare_history(load_merged_dataframe(CSV_FILE, BACKUP_CSV_FILE))
     # Need at least 2 unique snapshot times
-    if df["snapshot_time"].nunique() > 1:
-        # Keep df sorted and limited to last 90 days
-        df = df.sort_values("snapshot_time")
-        cutoff = df["snapshot_time"].max() - pd.Timedelta(days=90)
-        recent = df[df["snapshot_time"] >= cutoff].copy()
+    if not df.empty and df["snapshot_time"].nunique() > 1:
+        # Sort once; the 90-day window and the latest snapshot then come from
+        # O(log N) searchsorted boundaries instead of full boolean-mask scans.
+        df = df.sort_values("snapshot_time", kind="mergesort", ignore_index=True)
+        cutoff = df["snapshot_time"].iloc[-1] - pd.Timedelta(days=90)
+        recent = df.iloc[df["snapshot_time"].searchsorted(cutoff, side="left"):].copy()
         if recent.empty:
             logging.info("No recent data in the last 90 days.")
             return
@@ -343,12 +819,13 @@ def visualize_dashboard():
         recent = recent[pd.to_numeric(recent["peak_in_game"], errors="coerce").notnull()]
         recent["peak_in_game"] = pd.to_numeric(recent["peak_in_game"], errors="coerce")
 
-        # Latest top 10 by peak_in_game at the most recent snapshot
-        latest_time_recent = recent["snapshot_time"].max()
+        # Latest top 10 by peak_in_game at the most recent snapshot (the rows
+        # sharing the final timestamp form the tail of the sorted frame)
+        latest_time_recent = recent["snapshot_time"].iloc[-1]
+        latest_start = recent["snapshot_time"].searchsorted(latest_time_recent, side="left")
         latest_top10_appids = (
-            recent[recent["snapshot_time"] == latest_time_recent]
-            .sort_values("peak_in_game", ascending=False)
-            .head(10)["app_id"]
+            recent.iloc[latest_start:]
+            .nlargest(10, "peak_in_game")["app_id"]
             .tolist()
         )
 
@@ -361,9 +838,16 @@ def visualize_dashboard():
         # Use app_id for pivot columns, but keep a name map for legend labels
         name_map = recent_top10.groupby("app_id")["name"].last().to_dict()
 
-        pivot = recent_top10.pivot_table(index="snapshot_time", columns="app_id", values="peak_in_game")
-        # Resample to daily frequency to smooth uneven snapshot cadence
-        pivot = pivot.resample("D").mean()
+        # One hashed group pass (daily bucket x app) replaces the old
+        # pivot_table + resample("D") round-trip; asfreq reinserts empty days
+        # so uneven snapshot cadence still yields a continuous daily index.
+        pivot = (
+            recent_top10
+            .groupby([pd.Grouper(key="snapshot_time", freq="D"), "app_id"])["peak_in_game"]
+            .mean()
+            .unstack("app_id")
+            .asfreq("D")
+        )
         # Fill missing values (forward then back so series is continuous)
         pivot = pivot.ffill().bfill()
 
@@ -397,20 +881,31 @@ def visualize_dashboard():
             )
         )
 
-        fig2.show()
+        if HEADLESS:
+            trend_file = f"dashboard_trend_{latest_time_recent.strftime('%Y%m%d_%H%M%S')}.html"
+            fig2.write_html(trend_file)
+            logging.info("Saved trend chart to %s", trend_file)
+        else:
+            fig2.show()
 
 # ---------- Main ----------
 def main():
     logging.info("Starting PlayStats run (Top %d)...", TOP_N)
-    snapshot_time = datetime.now(timezone.utc).isoformat()
+    # one timestamp per run (second precision) so every row of a snapshot
+    # shares an identical snapshot_time and groups cleanly on equality
+    snapshot_time = datetime.now(timezone.utc).isoformat(timespec="seconds")
 
-    prev_ranks = load_latest_ranks(CSV_FILE)
-    top_games = fetch_top_games()
-    if not top_games:
-        logging.error("No top games fetched; aborting run.")
-        return
+    try:
+        prev_ranks = load_latest_ranks(CSV_FILE)
+        top_games = fetch_top_games()
+        if not top_games:
+            logging.error("No top games fetched; aborting run.")
+            return
+
+        df = collect_game_data(top_games, snapshot_time, prev_ranks)
+    finally:
+        SESSION.close()
 
-    df = collect_game_data(top_games, snapshot_time, prev_ranks)
     if save_snapshot(df):
         visualize_dashboard()
     else: